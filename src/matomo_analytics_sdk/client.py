@@ -1,14 +1,19 @@
 import inspect
+from functools import partial
 import requests
 import logging
 
 from .exceptions import MatomoAPIError, MatomoAuthError, MatomoRequestError
+from .hedging import Hedger, is_read_only
 from .models import Config
+from .schema import MatomoSchema
+from .tracking import MatomoTracker
 from . import modules
 from .modules import MatomoModule
 
 HTTP_TIMEOUT_SECONDS = 10
 PROTECTED_KEYS = {"base_url", "site_id", "token_auth"}
+OPTION_KEYS = ("period", "date", "segment")
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -20,7 +25,7 @@ logging.basicConfig(
 MODULES = [
     getattr(modules, name)
     for name, obj in inspect.getmembers(modules, inspect.isclass)
-    if obj is not MatomoModule
+    if issubclass(obj, MatomoModule) and obj is not MatomoModule
 ]
 
 
@@ -47,6 +52,11 @@ class MatomoClient:
         self.segment = config.segment
         self.verbose = verbose
         self._config = config
+        self._session = requests.Session()
+        self.schema = None
+        self.hedger = None
+        if config.hedge_percentile is not None:
+            self.hedger = Hedger(config.hedge_percentile, config.hedge_budget)
 
         if verbose:
             logger.setLevel(logging.DEBUG)
@@ -69,8 +79,40 @@ class MatomoClient:
             return self.modules[name]
         raise AttributeError(f"'{self.__class__.__name__}' has no module '{name}'")
 
-    def _request(self, module: str, method: str, **kwargs) -> dict:
+    def load_schema(self, cache_dir=None, refresh=False) -> MatomoSchema:
+        """Load the instance's report and segment metadata and validate requests against it.
+
+        The metadata is fetched once per Matomo version and cached in `cache_dir`.
+        """
+        self.schema = MatomoSchema.load(self, cache_dir=cache_dir, refresh=refresh)
+        return self.schema
+
+    def tracker(self, **options) -> MatomoTracker:
+        """Create a buffered bulk tracker sharing this client's config and session."""
+        return MatomoTracker(self, **options)
+
+    def with_options(self, **options) -> "MatomoClientView":
+        """Return an immutable view of this client with overridden options.
+
+        The view shares the client's HTTP session and module registry, so it
+        is cheap to create and safe to use from concurrent threads.
+        """
+        return MatomoClientView(self, **options)
+
+    def _options(self) -> dict:
+        return {key: getattr(self, key) for key in OPTION_KEYS}
+
+    def _request(self, module: str, method: str, _stats=None, **kwargs) -> dict:
         """Generic request handler for Matomo API."""
+        return self._send(module, method, self._options(), kwargs, stats=_stats)
+
+    def _send(
+        self, module: str, method: str, options: dict, kwargs: dict, stats=None
+    ) -> dict:
+        """Send a request using the given period/date/segment options.
+
+        When `stats` is a dict, the size of the response body is stored in it.
+        """
 
         data = {
             "module": "API",
@@ -78,9 +120,9 @@ class MatomoClient:
             "idSite": self.site_id,
             "token_auth": self.token_auth,
             "format": self.format,
-            "period": self.period,
-            "date": self.date,
-            "segment": self.segment,
+            "format_metrics": self.format_metrics,
+            "filter_limit": self.filter_limit,
+            **options,
         }
 
         filtered_kwargs = {}
@@ -91,13 +133,28 @@ class MatomoClient:
 
         data.update(filtered_kwargs)
 
+        if self.schema is not None:
+            self.schema.validate(module, method, data)
+
         url = f"{self.base_url}/"
 
         logger.debug(f"Sending request to {url} with data: {data}")
 
         try:
-            response = requests.post(url, data=data, timeout=HTTP_TIMEOUT_SECONDS)
-            response.raise_for_status()
+            if self.hedger is not None and is_read_only(method):
+                # Streamed so the losing response can be closed unread
+                response = self.hedger.call(
+                    f"{module}.{method}",
+                    partial(self._post, url, dict(data), stream=True),
+                    discard=requests.Response.close,
+                )
+            else:
+                response = self._post(url, data)
+            if stats is not None:
+                # Bytes on the wire when the server sends Content-Length
+                stats["bytes_received"] = int(
+                    response.headers.get("Content-Length", len(response.content))
+                )
             data = response.json()
 
             logger.debug(f"Response received: {data}")
@@ -127,6 +184,76 @@ class MatomoClient:
             logger.error(f"{err_msg} {e}")
             raise MatomoRequestError(f"{err_msg} {e}")
 
+    def _post(self, url: str, data: dict, stream=False) -> requests.Response:
+        response = self._session.post(
+            url, data=data, timeout=HTTP_TIMEOUT_SECONDS, stream=stream
+        )
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return response
+
     @classmethod
     def available_modules(cls):
         return [to_snake_case(module.__name__) for module in MODULES]
+
+
+class MatomoClientView:
+    """Immutable view of a MatomoClient with its own period, date and segment.
+
+    Views are created with `MatomoClient.with_options()`. They hold no
+    connection of their own: requests go through the parent client's session.
+    """
+
+    __slots__ = ("_client", "_opts", "_modules")
+
+    def __init__(self, client: MatomoClient, **options):
+        for key in options:
+            if key in PROTECTED_KEYS:
+                raise ValueError(f"{key} parameter cannot be modified.")
+            if key not in OPTION_KEYS:
+                raise ValueError(f"Unknown client option '{key}'.")
+
+        object.__setattr__(self, "_client", client)
+        object.__setattr__(self, "_opts", {**client._options(), **options})
+        object.__setattr__(self, "_modules", {})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{self.__class__.__name__}' is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"'{self.__class__.__name__}' is immutable")
+
+    def __getattr__(self, name):
+        if name in OPTION_KEYS:
+            return self._opts[name]
+        if name in self._client.modules:
+            return self._module(name)
+        return getattr(self._client, name)
+
+    def _module(self, name: str) -> MatomoModule:
+        module = self._modules.get(name)
+        if module is None:
+            module = type(self._client.modules[name])(self)
+            self._modules[name] = module
+        return module
+
+    @property
+    def client(self) -> MatomoClient:
+        return self._client
+
+    @property
+    def modules(self) -> dict:
+        """Modules bound to this view, so they use its period, date and segment."""
+        return {name: self._module(name) for name in self._client.modules}
+
+    def with_options(self, **options) -> "MatomoClientView":
+        return MatomoClientView(self._client, **{**self._opts, **options})
+
+    def _options(self) -> dict:
+        return dict(self._opts)
+
+    def _request(self, module: str, method: str, _stats=None, **kwargs) -> dict:
+        return self._client._send(module, method, self._opts, kwargs, stats=_stats)
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 100
+MIN_SAMPLES = 20
+
+
+def is_read_only(method: str) -> bool:
+    """Matomo read methods are all named get*."""
+    return method.startswith("get")
+
+
+class Hedger:
+    """Sends a duplicate of slow read-only requests and keeps the first answer.
+
+    A request is hedged once it has been running longer than `percentile` of the
+    recent latencies of its method, as long as hedges stay under `budget` times
+    the number of requests. A request already sent cannot be interrupted: the
+    losing one runs to completion in its own thread and its result is passed to
+    `discard`, e.g. to close the response and free its connection.
+    """
+
+    def __init__(self, percentile: float, budget: float = 0.05):
+        if not 0 < percentile < 1:
+            raise ValueError("hedge_percentile must be between 0 and 1.")
+        if budget < 0:
+            raise ValueError("hedge_budget cannot be negative.")
+
+        self.percentile = percentile
+        self.budget = budget
+        self._latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def delay(self, key: str):
+        """Latency after which a request for `key` is hedged, None if unknown."""
+        with self._lock:
+            samples = sorted(self._latencies[key])
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return samples[min(int(len(samples) * self.percentile), len(samples) - 1)]
+
+    def _timed(self, key: str, send):
+        started = time.monotonic()
+        result = send()
+        with self._lock:
+            self._latencies[key].append(time.monotonic() - started)
+        return result
+
+    def _start(self, key: str, send) -> Future:
+        """Run `send()` in its own thread, so calls never queue behind each other."""
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._timed(key, send))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="matomo-hedge", daemon=True).start()
+        return future
+
+    def _has_budget(self) -> bool:
+        return self.hedges + 1 <= self.budget * self.requests
+
+    def _can_hedge(self) -> bool:
+        with self._lock:
+            if not self._has_budget():
+                return False
+            self.hedges += 1
+            return True
+
+    def call(self, key: str, send, discard=None):
+        """Run `send()` and hedge it if it is slower than usual for `key`."""
+        delay = self.delay(key)
+        with self._lock:
+            self.requests += 1
+            hedgeable = delay is not None and self._has_budget()
+
+        if not hedgeable:
+            return self._timed(key, send)
+
+        primary = self._start(key, send)
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._can_hedge():
+            return primary.result()
+
+        logger.debug(f"Hedging {key} after {delay:.3f}s")
+        hedge = self._start(key, send)
+        pending = {primary, hedge}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            succeeded = [future for future in done if future.exception() is None]
+            # Fall back on the other request if this one failed
+            if not succeeded and pending:
+                continue
+
+            winner = succeeded[0] if succeeded else done.pop()
+            if discard is not None:
+                loser = primary if winner is hedge else hedge
+                loser.add_done_callback(_discard_result(discard))
+            if winner is hedge and succeeded:
+                with self._lock:
+                    self.hedge_wins += 1
+            return winner.result()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": self.hedges / self.requests if self.requests else 0.0,
+                "win_rate": self.hedge_wins / self.hedges if self.hedges else 0.0,
+            }
+
+
+def _discard_result(discard):
+    def callback(future):
+        if future.exception() is None:
+            discard(future.result())
+
+    return callback
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 100
+
+
+class VisitCursor:
+    """High-water mark of the visits already ingested from Live.getLastVisitsDetails.
+
+    `min_timestamp` is the last action timestamp of the most recent visit and
+    `boundary_ids` the visits seen with that exact timestamp, so a visit sharing
+    the boundary second is neither skipped nor ingested twice. A visit that gets
+    a new action after being ingested is yielded again with its new data.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.min_timestamp = None
+        self.boundary_ids = set()
+
+        if path and os.path.exists(path):
+            with open(path, "r") as file:
+                data = json.load(file)
+            self.min_timestamp = data["min_timestamp"]
+            self.boundary_ids = set(data["boundary_ids"])
+
+    def is_new(self, visit: dict) -> bool:
+        if self.min_timestamp is None:
+            return True
+        timestamp = int(visit["lastActionTimestamp"])
+        if timestamp == self.min_timestamp:
+            return int(visit["idVisit"]) not in self.boundary_ids
+        return timestamp > self.min_timestamp
+
+    def advance(self, visit: dict):
+        timestamp = int(visit["lastActionTimestamp"])
+        id_visit = int(visit["idVisit"])
+
+        if self.min_timestamp is None or timestamp > self.min_timestamp:
+            self.min_timestamp = timestamp
+            self.boundary_ids = {id_visit}
+        elif timestamp == self.min_timestamp:
+            self.boundary_ids.add(id_visit)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(
+                {
+                    "min_timestamp": self.min_timestamp,
+                    "boundary_ids": sorted(self.boundary_ids),
+                },
+                file,
+            )
+        os.replace(tmp_path, self.path)
+
+
+def iter_visits(module, cursor: VisitCursor, page_size=DEFAULT_PAGE_SIZE, **kwargs):
+    """Yields visits newer than `cursor`, oldest first, one page at a time.
+
+    Pages are keyed on the cursor: each one starts from the last action
+    timestamp reached so far, so a visit moving to the end of the list while
+    polling cannot shift the following pages. Offsets are only used to page
+    through visits sharing the boundary second.
+
+    The next page is only requested once the caller has consumed the current
+    one. The cursor moves past a visit when the following one is requested, and
+    is saved after every page and when the generator is closed.
+    """
+    params = {"filter_sort_order": "asc", "filter_limit": str(page_size), **kwargs}
+    offset = 0
+
+    try:
+        while True:
+            previous_timestamp = cursor.min_timestamp
+            if previous_timestamp is not None:
+                # Matomo keeps visits strictly newer than minTimestamp, step back
+                # one second to fetch the boundary again and deduplicate it here
+                params["minTimestamp"] = previous_timestamp - 1
+                start = datetime.fromtimestamp(previous_timestamp, timezone.utc)
+                # One day of margin for the site timezone
+                start_date = (start - timedelta(days=1)).strftime("%Y-%m-%d")
+                params.setdefault("period", "range")
+                params.setdefault("date", f"{start_date},today")
+            params["filter_offset"] = str(offset)
+
+            visits = module.client._request(
+                module.module_name, "getLastVisitsDetails", **params
+            )
+            logger.debug(f"Fetched {len(visits)} visits at offset {offset}")
+
+            for visit in visits:
+                if cursor.is_new(visit):
+                    yield visit
+                    cursor.advance(visit)
+
+            cursor.save()
+            if len(visits) < page_size:
+                return
+
+            if cursor.min_timestamp == previous_timestamp:
+                # The whole page is within the boundary second
+                offset += page_size
+            else:
+                offset = 0
+    finally:
+        cursor.save()
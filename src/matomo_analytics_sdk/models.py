@@ -14,3 +14,5 @@ class Config:
     filter_limit: str = "100"
     format: str = "json"
     format_metrics: str = "0"
+    hedge_percentile: Optional[float] = None
+    hedge_budget: float = 0.05
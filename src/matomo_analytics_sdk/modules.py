@@ -1,5 +1,7 @@
 import logging
-from .utils import available_methods
+from .ingestion import DEFAULT_PAGE_SIZE, VisitCursor, iter_visits
+from .query import ReportQuery
+from .utils import available_methods, is_available_method
 
 logger = logging.getLogger(__name__)
 
@@ -18,10 +20,18 @@ class MatomoModule:
             raise ValueError("Client is not set for this module.")
         return available_methods(self.module_name)
 
+    def query(self, method_name) -> ReportQuery:
+        """Start a report query with server-side projection and filters."""
+        if not is_available_method(self.module_name, method_name):
+            raise AttributeError(
+                f"'{self.module_name}' module has no method '{method_name}'"
+            )
+        return ReportQuery(self, method_name)
+
     def __getattr__(self, method_name):
         """Dynamically call API methods."""
 
-        if method_name not in available_methods(self.module_name):
+        if not is_available_method(self.module_name, method_name):
             raise AttributeError(
                 f"'{self.module_name}' module has no method '{method_name}'"
             )
@@ -51,7 +61,7 @@ class WemapCustomReports(MatomoModule):
 
             module_name, method_name = method.split(".")
 
-            if method_name not in available_methods(module_name):
+            if not is_available_method(module_name, method_name):
                 raise AttributeError(f"'{module_name}' module has no method '{method_name}'")
 
             # Extract kwargs to pass to the actual request
@@ -98,6 +108,16 @@ class Events(MatomoModule):
     pass
 
 
+class Live(MatomoModule):
+    """The Live API lets you access complete visit level information about your visitors."""
+
+    def streamVisits(self, cursor=None, page_size=DEFAULT_PAGE_SIZE, **kwargs):
+        """Yield visits not ingested yet. `cursor` is a VisitCursor or a file path."""
+        if not isinstance(cursor, VisitCursor):
+            cursor = VisitCursor(cursor)
+        return iter_visits(self, cursor, page_size=page_size, **kwargs)
+
+
 class Referrers(MatomoModule):
     """The Referrers API lets you access reports about Websites, Search engines, Keywords, Campaigns used to access your website."""
 
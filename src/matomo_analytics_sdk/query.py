@@ -0,0 +1,173 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+SORT_ORDERS = ("asc", "desc")
+
+
+class ReportQuery:
+    """Builds a report request whose projection and filters are applied by Matomo.
+
+    Every option is sent to the server. The same options are also applied to the
+    response, which covers plugins or versions that ignore some of them, and
+    `where()` predicates that Matomo cannot evaluate. With `where()` predicates,
+    limit and offset can only be applied after them, so they are applied locally
+    and the server sends every row.
+    """
+
+    def __init__(self, module, method_name: str):
+        self.module = module
+        self.method_name = method_name
+        self.params = {}
+        self.predicates = []
+        self.stats = {}
+
+    def columns(self, *columns):
+        """Only return these columns (showColumns)."""
+        self.params["showColumns"] = ",".join(columns)
+        return self
+
+    def hide(self, *columns):
+        """Drop these columns from the response (hideColumns)."""
+        self.params["hideColumns"] = ",".join(columns)
+        return self
+
+    def sort(self, column: str, order: str = "desc"):
+        if order not in SORT_ORDERS:
+            raise ValueError(f"Sort order must be one of {SORT_ORDERS}.")
+        self.params["filter_sort_column"] = column
+        self.params["filter_sort_order"] = order
+        return self
+
+    def limit(self, limit: int):
+        self.params["filter_limit"] = str(limit)
+        return self
+
+    def offset(self, offset: int):
+        self.params["filter_offset"] = str(offset)
+        return self
+
+    def pattern(self, pattern: str, column: str = "label"):
+        """Keep rows whose `column` matches the regular expression `pattern`."""
+        self.params["filter_pattern"] = pattern
+        self.params["filter_column"] = column
+        return self
+
+    def flat(self, flat: bool = True):
+        self.params["flat"] = "1" if flat else "0"
+        return self
+
+    def expanded(self, expanded: bool = True):
+        self.params["expanded"] = "1" if expanded else "0"
+        return self
+
+    def where(self, predicate):
+        """Keep rows for which `predicate(row)` is true. Applied locally only."""
+        self.predicates.append(predicate)
+        return self
+
+    def fetch(self, **kwargs):
+        """Send the request and return the filtered report."""
+        params = {**self.params, **kwargs}
+        if self.predicates:
+            params.pop("filter_offset", None)
+            params["filter_limit"] = "-1"
+
+        stats = {}
+        response = self.module.client._request(
+            self.module.module_name, self.method_name, _stats=stats, **params
+        )
+        data = self._apply(response)
+
+        self.stats = {
+            "bytes_received": stats.get("bytes_received"),
+            "rows_received": _count_rows(response),
+            "rows_returned": _count_rows(data),
+        }
+        logger.debug(
+            f"Query {self.module.module_name}.{self.method_name} received "
+            f"{self.stats['bytes_received']} bytes, {self.stats['rows_received']} rows."
+        )
+        return data
+
+    def _apply(self, data):
+        if isinstance(data, list):
+            return self._apply_rows(data)
+        if isinstance(data, dict):
+            if data and all(isinstance(value, list) for value in data.values()):
+                # One table per period
+                return {key: self._apply_rows(rows) for key, rows in data.items()}
+            if data and all(isinstance(value, dict) for value in data.values()):
+                # One row per period, e.g. API.get over several dates
+                return {
+                    key: self._project(row)
+                    for key, row in data.items()
+                    if self._matches(row)
+                }
+            return self._project(data) if self._matches(data) else {}
+        return data
+
+    def _matches(self, row: dict) -> bool:
+        return all(predicate(row) for predicate in self.predicates)
+
+    def _apply_rows(self, rows: list) -> list:
+        rows = [row for row in rows if isinstance(row, dict)]
+
+        pattern = self.params.get("filter_pattern")
+        if pattern:
+            column = self.params.get("filter_column", "label")
+            regex = re.compile(pattern, re.IGNORECASE)
+            rows = [row for row in rows if regex.search(str(row.get(column, "")))]
+
+        rows = [row for row in rows if self._matches(row)]
+
+        sort_column = self.params.get("filter_sort_column")
+        if sort_column:
+            rows = sorted(
+                rows,
+                key=lambda row: _sort_key(row.get(sort_column)),
+                reverse=self.params["filter_sort_order"] == "desc",
+            )
+
+        # Limit and offset are applied here after where() predicates, or when
+        # a longer result than requested means the server ignored them
+        limit = int(self.params.get("filter_limit", -1))
+        offset = int(self.params.get("filter_offset", 0))
+        if self.predicates:
+            rows = rows[offset : offset + limit] if limit >= 0 else rows[offset:]
+        elif limit >= 0 and len(rows) > limit:
+            rows = rows[offset : offset + limit]
+
+        return [self._project(row) for row in rows]
+
+    def _project(self, row: dict) -> dict:
+        show = self.params.get("showColumns")
+        hide = self.params.get("hideColumns")
+        if show:
+            keep = set(show.split(",")) | {"label"}
+            row = {key: value for key, value in row.items() if key in keep}
+        if hide:
+            drop = set(hide.split(","))
+            row = {key: value for key, value in row.items() if key not in drop}
+        return row
+
+
+def _count_rows(data) -> int:
+    if isinstance(data, list):
+        return len(data)
+    if isinstance(data, dict) and data:
+        if all(isinstance(value, list) for value in data.values()):
+            return sum(len(rows) for rows in data.values())
+        if all(isinstance(value, dict) for value in data.values()):
+            return len(data)
+        return 1
+    return 0
+
+
+def _sort_key(value):
+    # Matomo returns some metrics as strings, compare numbers numerically
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
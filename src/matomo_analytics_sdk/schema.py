@@ -0,0 +1,160 @@
+import json
+import logging
+import os
+import re
+from urllib.parse import urlparse
+
+from .exceptions import MatomoValidationError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCHEMA_CACHE_DIR = os.path.join("~", ".cache", "matomo_analytics_sdk")
+PERIODS = {"day", "week", "month", "year", "range"}
+COLUMN_PARAMS = ("showColumns", "hideColumns", "filter_sort_column")
+METRIC_KEYS = ("metrics", "processedMetrics", "metricsGoal", "processedMetricsGoal")
+
+# Splits a segment definition on its AND (;) and OR (,) operators and keeps
+# the dimension name in front of the comparison operator.
+SEGMENT_CONDITION = re.compile(r"^\s*([A-Za-z0-9_.]+)\s*(==|!=|<=|>=|=@|!@|=\^|=\$|<|>)")
+
+
+def _columns(report: dict) -> set:
+    columns = {"label"}
+    for key in METRIC_KEYS:
+        if isinstance(report.get(key), dict):
+            columns.update(report[key].keys())
+    return columns
+
+
+def compact_schema(version: str, reports: list, segments: list) -> dict:
+    """Reduces Matomo report and segment metadata to what validation needs."""
+    compact = {}
+
+    for report in reports:
+        methods = [f"{report['module']}.{report['action']}"]
+        if report.get("actionToLoadSubTables"):
+            methods.append(f"{report['module']}.{report['actionToLoadSubTables']}")
+
+        for method in methods:
+            entry = compact.setdefault(method, {"parameters": None, "columns": set()})
+            entry["columns"].update(_columns(report))
+
+            # Parameters required by every variant of the report, e.g. idDimension
+            parameters = set((report.get("parameters") or {}).keys())
+            if entry["parameters"] is None:
+                entry["parameters"] = parameters
+            else:
+                entry["parameters"] &= parameters
+
+    return {
+        "version": version,
+        "reports": {
+            method: {
+                "parameters": sorted(entry["parameters"] or ()),
+                "columns": sorted(entry["columns"]),
+            }
+            for method, entry in sorted(compact.items())
+        },
+        "segments": sorted({segment["segment"] for segment in segments}),
+    }
+
+
+def segment_dimensions(segment: str) -> list:
+    """Returns the dimension names used in a segment definition."""
+    dimensions = []
+    for condition in re.split(r"[;,]", segment):
+        match = SEGMENT_CONDITION.match(condition)
+        if match:
+            dimensions.append(match.group(1))
+    return dimensions
+
+
+class MatomoSchema:
+    """Local copy of the report and segment metadata of a Matomo instance."""
+
+    def __init__(self, data: dict):
+        self.version = data["version"]
+        self.reports = {
+            method: {
+                "parameters": frozenset(report["parameters"]),
+                "columns": frozenset(report["columns"]),
+            }
+            for method, report in data["reports"].items()
+        }
+        self.segments = frozenset(data["segments"])
+
+    @staticmethod
+    def cache_path(base_url: str, site_id, version: str, cache_dir=None) -> str:
+        host = re.sub(r"[^A-Za-z0-9.-]", "_", urlparse(base_url).netloc)
+        file_name = f"schema_{host}_{site_id}_{version}.json"
+        return os.path.join(
+            os.path.expanduser(cache_dir or DEFAULT_SCHEMA_CACHE_DIR), file_name
+        )
+
+    @classmethod
+    def load(cls, client, cache_dir=None, refresh=False) -> "MatomoSchema":
+        """Loads the schema from the local cache, fetching it once per Matomo version."""
+        version = client._send("API", "getMatomoVersion", {}, {})["value"]
+        path = cls.cache_path(client.base_url, client.site_id, version, cache_dir)
+
+        if not refresh and os.path.exists(path):
+            logger.debug(f"Loading Matomo schema from {path}")
+            with open(path, "r") as file:
+                return cls(json.load(file))
+
+        logger.info(f"Fetching Matomo {version} schema.")
+        # Matomo applies filter_limit to the metadata lists too
+        params = {"idSites": client.site_id, "filter_limit": "-1"}
+        reports = client._send("API", "getReportMetadata", {}, params)
+        segments = client._send("API", "getSegmentsMetadata", {}, params)
+        data = compact_schema(version, reports, segments)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            json.dump(data, file)
+
+        return cls(data)
+
+    def report(self, module: str, method: str):
+        return self.reports.get(f"{module}.{method}")
+
+    def columns(self, module: str, method: str) -> frozenset:
+        report = self.report(module, method)
+        return report["columns"] if report else frozenset()
+
+    def validate(self, module: str, method: str, params: dict):
+        """Raises MatomoValidationError for requests Matomo would reject or misread.
+
+        Methods that are not reports are not described by the metadata API and
+        are not checked, so methods of inactive plugins are not detected.
+        """
+        period = params.get("period")
+        if period and period not in PERIODS:
+            raise MatomoValidationError(f"Invalid period '{period}'.")
+
+        segment = params.get("segment")
+        if segment and self.segments:
+            for dimension in segment_dimensions(segment):
+                if dimension not in self.segments:
+                    raise MatomoValidationError(
+                        f"Unknown segment dimension '{dimension}'."
+                    )
+
+        report = self.report(module, method)
+        if report is None:
+            return
+
+        missing = report["parameters"].difference(params)
+        if missing:
+            raise MatomoValidationError(
+                f"'{module}.{method}' requires parameters: {', '.join(sorted(missing))}"
+            )
+
+        # The metadata does not list every column (goal specific, sum_daily_*)
+        # and Matomo ignores unknown ones, so only warn
+        for key in COLUMN_PARAMS:
+            for column in str(params.get(key) or "").split(","):
+                if column and column not in report["columns"]:
+                    logger.warning(
+                        f"'{module}.{method}' metadata has no column '{column}' ({key})."
+                    )
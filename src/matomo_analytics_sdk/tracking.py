@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from urllib.parse import urlencode
+
+import requests
+
+from .exceptions import MatomoRequestError
+
+logger = logging.getLogger(__name__)
+
+TRACKING_ENDPOINT = "matomo.php"
+TRACKING_TIMEOUT_SECONDS = 10
+DEFAULT_QUEUE_SIZE = 10000
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 5.0
+# Client errors worth sending again later
+RETRYABLE_STATUS_CODES = {408, 429}
+
+_STOP = object()
+
+
+class MatomoTracker:
+    """Buffers tracking hits and sends them with Matomo's bulk tracking API.
+
+    Hits are queued by `track()` and sent from a background thread every
+    `batch_size` hits or `flush_interval` seconds, or when `flush()` is called.
+    Batches that fail on a network or server error are written to `spool_dir`
+    and sent again after the next successful batch or every `flush_interval`.
+    Batches rejected by Matomo (4xx other than 408 and 429) are set aside as
+    `*.rejected` files.
+    """
+
+    def __init__(
+        self,
+        client,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        batch_size=DEFAULT_BATCH_SIZE,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        spool_dir=None,
+    ):
+        self.client = client
+        self.url = f"{client.base_url}/{TRACKING_ENDPOINT}"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_dir = spool_dir
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+
+        self._worker = threading.Thread(
+            target=self._run, name="matomo-tracker", daemon=True
+        )
+        self._worker.start()
+
+    def track(self, block=True, timeout=None, **params):
+        """Queue a tracking hit. Blocks while the queue is full unless `block` is False."""
+        if self._closed:
+            raise MatomoRequestError("Tracker is closed")
+
+        # Matomo records hits when it receives them unless cdt is given
+        hit = {
+            "idsite": self.client.site_id,
+            "rec": 1,
+            "cdt": int(time.time()),
+            **params,
+        }
+        try:
+            self._queue.put(f"?{urlencode(hit)}", block=block, timeout=timeout)
+        except queue.Full:
+            raise MatomoRequestError("Tracking queue is full")
+
+    async def track_async(self, **params):
+        """Queue a tracking hit without blocking the event loop."""
+        try:
+            self.track(block=False, **params)
+        except MatomoRequestError:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, lambda: self.track(**params))
+
+    def flush(self):
+        """Send every hit queued so far and wait until it is done."""
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    async def flush_async(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.flush)
+
+    def close(self):
+        """Stop the background thread and send the remaining hits."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._worker.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None
+            if deadline is not None:
+                timeout = max(deadline - time.monotonic(), 0)
+            elif self.spool_dir:
+                # Wake up to retry the spool even when nothing is tracked
+                timeout = self.flush_interval
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+                if not batch:
+                    self._run_safely(self._replay_spool)
+                    continue
+
+            if isinstance(item, str):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            # Batch is full, flush_interval elapsed, flush() or close() was called
+            if batch:
+                self._run_safely(self._send, batch)
+            batch = []
+            deadline = None
+
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is _STOP:
+                return
+
+    def _run_safely(self, function, *args):
+        try:
+            function(*args)
+        except Exception:
+            # Keep the worker alive so flush() and close() never hang
+            logger.exception("Tracking worker error.")
+
+    def _post(self, batch: list):
+        payload = {"requests": batch, "token_auth": self.client.token_auth}
+        response = self.client._session.post(
+            self.url, json=payload, timeout=TRACKING_TIMEOUT_SECONDS
+        )
+        response.raise_for_status()
+        data = response.json()
+        if not isinstance(data, dict):
+            # Not an answer from Matomo, e.g. a proxy page: retry later
+            raise ValueError(f"Unexpected bulk tracking response: {data!r}")
+        if data.get("status") != "success":
+            raise MatomoRequestError(f"Bulk tracking failed: {data}")
+
+    @staticmethod
+    def _is_rejected(error: Exception) -> bool:
+        """Whether Matomo refused the batch itself, so sending it again won't help."""
+        if isinstance(error, MatomoRequestError):
+            return True
+        response = getattr(error, "response", None)
+        return (
+            response is not None
+            and 400 <= response.status_code < 500
+            and response.status_code not in RETRYABLE_STATUS_CODES
+        )
+
+    def _send(self, batch: list):
+        try:
+            self._post(batch)
+        except (requests.RequestException, ValueError, MatomoRequestError) as e:
+            logger.error(f"Failed to send {len(batch)} tracking hits: {e}")
+            self._spool(batch, rejected=self._is_rejected(e))
+            return
+
+        logger.debug(f"Sent {len(batch)} tracking hits.")
+        self._replay_spool()
+
+    def _spool(self, batch: list, rejected=False):
+        if not self.spool_dir:
+            logger.error(f"No spool directory, {len(batch)} tracking hits dropped.")
+            return
+        path = os.path.join(self.spool_dir, f"{time.time_ns()}-{uuid.uuid4().hex}.json")
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(batch, file)
+        os.replace(f"{path}.tmp", f"{path}.rejected" if rejected else path)
+
+    def _replay_spool(self):
+        if not self.spool_dir:
+            return
+        for file_name in sorted(os.listdir(self.spool_dir)):
+            if not file_name.endswith(".json"):
+                continue
+            path = os.path.join(self.spool_dir, file_name)
+            with open(path, "r") as file:
+                batch = json.load(file)
+            try:
+                self._post(batch)
+            except (requests.RequestException, ValueError, MatomoRequestError) as e:
+                if not self._is_rejected(e):
+                    # Server still unavailable, retry later
+                    return
+                logger.error(f"Spooled tracking hits rejected, set aside: {e}")
+                os.replace(path, f"{path}.rejected")
+                continue
+            os.remove(path)
+            logger.info(f"Sent {len(batch)} spooled tracking hits.")
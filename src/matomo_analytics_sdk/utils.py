@@ -1,5 +1,6 @@
 import json
 import os
+from functools import lru_cache
 import pkg_resources
 
 import requests
@@ -47,16 +48,26 @@ def fetch_modules_and_methods() -> dict:
     return api_methods
 
 
+@lru_cache(maxsize=None)
+def _method_registry() -> dict:
+    """Loads the modules and methods file once per process."""
+    data = read_json(MODULES_AND_METHODS)
+    return {module: tuple(methods) for module, methods in data.items()}
+
+
 def available_modules() -> list:
     """Returns all available modules on Matomo API."""
-    data = read_json(MODULES_AND_METHODS)
-    return list(data.keys())
+    return list(_method_registry().keys())
 
 
 def available_methods(module_name: str) -> list:
     """Returns all available methods for a given module."""
-    data = read_json(MODULES_AND_METHODS)
-    return data.get(module_name, [])
+    return list(_method_registry().get(module_name, ()))
+
+
+def is_available_method(module_name: str, method_name: str) -> bool:
+    """Checks a method against the registry without copying it."""
+    return method_name in _method_registry().get(module_name, ())
 
 
 def sync_modules_and_methods():
@@ -64,3 +75,4 @@ def sync_modules_and_methods():
     new_data = fetch_modules_and_methods()
     old_data.update(new_data)
     write_json(MODULES_AND_METHODS, old_data)
+    _method_registry.cache_clear()
@@ -1,5 +1,8 @@
 import json
+import logging
 import os
+import time
+from urllib.parse import parse_qsl
 
 import requests
 import responses
@@ -8,7 +11,8 @@ from pydantic import ValidationError
 
 from src.matomo_analytics_sdk.client import MatomoClient
 from src.matomo_analytics_sdk.models import Config
-from src.matomo_analytics_sdk.exceptions import MatomoRequestError
+from src.matomo_analytics_sdk.hedging import Hedger
+from src.matomo_analytics_sdk.exceptions import MatomoRequestError, MatomoValidationError
 
 
 def read_json(rel_path):
@@ -46,6 +50,85 @@ def test_client():
     assert client.segment == f"dimension2=={livemap}"
 
 
+def test_client_with_options():
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        period="day",
+        date="today",
+    )
+    client = MatomoClient(config)
+
+    view = client.with_options(period="range", segment="dimension2==16215")
+
+    assert view.period == "range"
+    assert view.date == "today"
+    assert view.segment == "dimension2==16215"
+    assert view.site_id == client.site_id
+    assert view.client is client
+    assert view.events.client is view
+    assert view.modules["events"] is view.events
+    assert client.modules["events"].client is client
+
+    # parent is left untouched
+    assert client.period == "day"
+    assert client.segment is None
+
+    chained = view.with_options(date="yesterday")
+    assert chained.period == "range"
+    assert chained.date == "yesterday"
+
+    try:
+        view.segment = "dimension2==1"
+        assert False, "view should be immutable"
+    except AttributeError as err:
+        assert "immutable" in str(err)
+
+    try:
+        client.with_options(token_auth="12345")
+        assert False, "protected keys must be rejected"
+    except ValueError as err:
+        assert "token_auth parameter cannot be modified." in str(err)
+
+
+@responses.activate
+def test_client_with_options_request():
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        period="day",
+        date="2024-01-01,2024-01-02",
+    )
+    client = MatomoClient(config)
+    segment = "dimension2==16215"
+
+    params = {
+        "module": "API",
+        "method": "Events.getName",
+        "idSite": client.site_id,
+        "token_auth": client.token_auth,
+        "format": client.format,
+        "format_metrics": client.format_metrics,
+        "filter_limit": client.filter_limit,
+        "period": client.period,
+        "date": client.date,
+        "segment": segment,
+    }
+
+    responses.add(
+        responses.POST,
+        client.base_url,
+        match=[matchers.urlencoded_params_matcher(params)],
+        json=read_json("tests/files/Events_getName.json"),
+        status=200,
+    )
+
+    events = client.with_options(segment=segment).events.getName()
+    assert len(events["2024-01-01"]) == 59
+
+
 def test_missing_positional_param_in_client():
     try:
         # missing token_auth positional
@@ -150,6 +233,8 @@ def test_events_get_name():
         "idSite": client.site_id,
         "token_auth": client.token_auth,
         "format": client.format,
+        "format_metrics": client.format_metrics,
+        "filter_limit": client.filter_limit,
         "period": client.period,
         "date": client.date,
         "segment": segment,
@@ -266,6 +351,8 @@ def test_wemap_custom_report():
             "idSite": client.site_id,
             "token_auth": client.token_auth,
             "format": client.format,
+            "format_metrics": client.format_metrics,
+            "filter_limit": client.filter_limit,
             "date": client.date,
             "segment": segment,
         }
@@ -391,3 +478,495 @@ def test_request_exception(mocker):
         client.events.available_methods()
     except MatomoRequestError as err:
         assert "Matomo request failed:" in str(err)
+
+
+def method_matcher(method):
+    def match(request):
+        params = dict(parse_qsl(request.body))
+        return params.get("method") == method, f"method is not {method}"
+
+    return match
+
+
+def add_schema_responses(base_url):
+    responses.add(
+        responses.POST,
+        base_url,
+        match=[method_matcher("API.getMatomoVersion")],
+        json={"value": "5.1.0"},
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        base_url,
+        match=[method_matcher("API.getReportMetadata")],
+        json=[
+            {
+                "module": "Events",
+                "action": "getName",
+                "metrics": {"nb_events": "Events", "nb_visits": "Visits"},
+                "processedMetrics": False,
+                "actionToLoadSubTables": "getActionFromNameId",
+            },
+            {
+                "module": "CustomDimensions",
+                "action": "getCustomDimension",
+                "parameters": {"idDimension": "3"},
+                "metrics": {"nb_visits": "Visits"},
+            },
+        ],
+        status=200,
+    )
+    responses.add(
+        responses.POST,
+        base_url,
+        match=[method_matcher("API.getSegmentsMetadata")],
+        json=[{"segment": "dimension2"}, {"segment": "eventCategory"}],
+        status=200,
+    )
+
+
+@responses.activate
+def test_schema_validation(tmp_path, caplog):
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        period="day",
+        date="today",
+    )
+    client = MatomoClient(config)
+    add_schema_responses(client.base_url)
+
+    schema = client.load_schema(cache_dir=str(tmp_path))
+
+    assert schema.version == "5.1.0"
+    assert schema.columns("Events", "getActionFromNameId") == {"label", "nb_events", "nb_visits"}
+    assert len(list(tmp_path.iterdir())) == 1
+
+    for call in responses.calls[1:3]:
+        params = dict(parse_qsl(call.request.body))
+        assert params["method"] in ("API.getReportMetadata", "API.getSegmentsMetadata")
+        assert params["filter_limit"] == "-1"
+
+    invalid_calls = [
+        (client.events.getName, {"segment": "browserCode==FF"}, "Unknown segment dimension 'browserCode'"),
+        (client.events.getName, {"period": "decade"}, "Invalid period 'decade'"),
+        (client.custom_dimensions.getCustomDimension, {}, "requires parameters: idDimension"),
+    ]
+    for method, kwargs, message in invalid_calls:
+        try:
+            method(**kwargs)
+            assert False, "request should be rejected before being sent"
+        except MatomoValidationError as err:
+            assert message in str(err)
+
+    # Columns missing from the metadata only log a warning
+    with caplog.at_level(logging.WARNING):
+        schema.validate(
+            "Events",
+            "getName",
+            {
+                "showColumns": "nb_events,sum_daily_nb_uniq_visitors",
+                "filter_sort_column": "sum_daily_nb_uniq_visitors",
+            },
+        )
+    assert "no column 'sum_daily_nb_uniq_visitors' (filter_sort_column)" in caplog.text
+
+    # Cached schema is reused: only the version is requested again
+    calls = len(responses.calls)
+    MatomoClient(config).load_schema(cache_dir=str(tmp_path))
+    assert len(responses.calls) == calls + 1
+
+
+@responses.activate
+def test_report_query_pushdown():
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        period="day",
+        date="2024-01-01,2024-01-02",
+    )
+    client = MatomoClient(config)
+
+    params = {
+        "module": "API",
+        "method": "Events.getName",
+        "idSite": client.site_id,
+        "token_auth": client.token_auth,
+        "format": client.format,
+        "format_metrics": client.format_metrics,
+        "period": client.period,
+        "date": client.date,
+        "showColumns": "nb_visits,nb_events",
+        "filter_sort_column": "nb_events",
+        "filter_sort_order": "desc",
+        "filter_limit": "3",
+        "flat": "1",
+    }
+
+    # The mocked server ignores every filter, the query applies them locally
+    responses.add(
+        responses.POST,
+        client.base_url,
+        match=[matchers.urlencoded_params_matcher(params)],
+        json=read_json("tests/files/Events_getName.json"),
+        status=200,
+    )
+
+    query = (
+        client.events.query("getName")
+        .columns("nb_visits", "nb_events")
+        .sort("nb_events")
+        .limit(3)
+        .flat()
+    )
+    events = query.fetch()
+
+    rows = events["2024-01-01"]
+    assert len(rows) == 3
+    assert set(rows[0].keys()) == {"label", "nb_visits", "nb_events"}
+    assert [int(row["nb_events"]) for row in rows] == sorted(
+        [int(row["nb_events"]) for row in rows], reverse=True
+    )
+    assert query.stats["bytes_received"] == len(
+        json.dumps(read_json("tests/files/Events_getName.json"))
+    )
+    assert query.stats["rows_returned"] == 6
+    assert query.stats["rows_received"] > query.stats["rows_returned"]
+
+
+@responses.activate
+def test_report_query_where_with_limit():
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        period="day",
+        date="today",
+    )
+    client = MatomoClient(config)
+    rows = [{"label": f"row {i}", "nb_visits": i} for i in range(100)]
+    requests_params = []
+
+    def get_name(request):
+        params = dict(parse_qsl(request.body))
+        requests_params.append(params)
+        limit = int(params["filter_limit"])
+        offset = int(params.get("filter_offset", 0))
+        page = rows[offset:] if limit < 0 else rows[offset : offset + limit]
+        return 200, {}, json.dumps(page)
+
+    responses.add_callback(responses.POST, client.base_url, callback=get_name)
+
+    events = (
+        client.events.query("getName")
+        .where(lambda row: row["nb_visits"] % 2 == 1)
+        .offset(1)
+        .limit(5)
+        .fetch()
+    )
+
+    # The predicate runs on every row, then offset and limit apply locally
+    assert [row["nb_visits"] for row in events] == [3, 5, 7, 9, 11]
+    assert requests_params[0]["filter_limit"] == "-1"
+    assert "filter_offset" not in requests_params[0]
+
+
+def test_report_query_where_on_rows_by_period(mocker):
+    config = Config(
+        base_url="https://analytics.maaap.it", site_id="2", token_auth="random_token"
+    )
+    client = MatomoClient(config)
+    mocker.patch.object(
+        client,
+        "_request",
+        return_value={
+            "2025-03-01": {"nb_visits": 3, "nb_actions": 10},
+            "2025-03-02": {"nb_visits": 0, "nb_actions": 0},
+        },
+    )
+
+    report = client.api.query("get").where(lambda row: row["nb_visits"] > 0).fetch()
+    assert report == {"2025-03-01": {"nb_visits": 3, "nb_actions": 10}}
+
+    mocker.patch.object(client, "_request", return_value={"nb_visits": 0})
+    assert client.api.query("get").where(lambda row: row["nb_visits"] > 0).fetch() == {}
+
+
+def test_hedged_requests():
+    hedger = Hedger(percentile=0.9, budget=0.5)
+    for _ in range(20):
+        hedger.call("Events.getName", lambda: "fast")
+
+    calls = []
+
+    def send():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "stalled"
+        return "hedged"
+
+    discarded = []
+    assert hedger.call("Events.getName", send, discard=discarded.append) == "hedged"
+    assert len(calls) == 2
+
+    # The stalled request finishes later and its result is discarded
+    for _ in range(100):
+        if discarded:
+            break
+        time.sleep(0.01)
+    assert discarded == ["stalled"]
+
+    metrics = hedger.metrics()
+    assert metrics["requests"] == 21
+    assert metrics["hedges"] == 1
+    assert metrics["hedge_wins"] == 1
+    assert metrics["win_rate"] == 1.0
+
+    # No budget left for another hedge
+    hedger.budget = 0.0
+    calls.clear()
+    assert hedger.call("Events.getName", send) == "stalled"
+    assert len(calls) == 1
+
+
+def test_hedging_config():
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        hedge_percentile=0.95,
+    )
+    client = MatomoClient(config)
+
+    assert client.hedger.percentile == 0.95
+    assert client.hedger.budget == 0.05
+
+    config.hedge_percentile = None
+    assert MatomoClient(config).hedger is None
+
+
+@responses.activate
+def test_hedged_client_request():
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        period="day",
+        date="today",
+        hedge_percentile=0.9,
+        hedge_budget=0.5,
+    )
+    client = MatomoClient(config)
+    bodies = []
+
+    def get_name(request):
+        bodies.append(request.body)
+        # The first request after warm up stalls
+        if len(bodies) == 21:
+            time.sleep(0.5)
+            return 200, {}, json.dumps([{"label": "stalled"}])
+        return 200, {}, json.dumps([{"label": "kiosk"}])
+
+    responses.add_callback(responses.POST, client.base_url, callback=get_name)
+
+    for _ in range(20):
+        client.events.getName()
+
+    assert client.events.getName() == [{"label": "kiosk"}]
+    assert len(bodies) == 22
+    # The hedge sends the same request as the stalled one
+    assert bodies[21] == bodies[20]
+
+    metrics = client.hedger.metrics()
+    assert metrics["requests"] == 21
+    assert metrics["hedges"] == 1
+    assert metrics["hedge_wins"] == 1
+
+
+@responses.activate
+def test_live_stream_visits(tmp_path):
+    config = Config(
+        base_url="https://analytics.maaap.it",
+        site_id="2",
+        token_auth="random_token",
+        period="day",
+        date="today",
+    )
+    client = MatomoClient(config)
+    cursor_path = str(tmp_path / "cursor.json")
+
+    visits = [
+        {"idVisit": 1, "lastActionTimestamp": 1700000000},
+        {"idVisit": 2, "lastActionTimestamp": 1700000010},
+        {"idVisit": 3, "lastActionTimestamp": 1700000010},
+    ]
+    requests_params = []
+
+    def last_visits(request):
+        params = dict(parse_qsl(request.body))
+        requests_params.append(params)
+        min_timestamp = int(params.get("minTimestamp", 0))
+        offset = int(params["filter_offset"])
+        limit = int(params["filter_limit"])
+        newer = sorted(
+            (v for v in visits if v["lastActionTimestamp"] > min_timestamp),
+            key=lambda v: v["lastActionTimestamp"],
+        )
+        return 200, {}, json.dumps(newer[offset : offset + limit])
+
+    responses.add_callback(responses.POST, client.base_url, callback=last_visits)
+
+    first_poll = list(client.live.streamVisits(cursor_path, page_size=2))
+    assert [visit["idVisit"] for visit in first_poll] == [1, 2, 3]
+    assert [params["filter_offset"] for params in requests_params] == ["0", "0", "2"]
+    assert [params.get("minTimestamp") for params in requests_params] == [
+        None,
+        "1700000009",
+        "1700000009",
+    ]
+    assert read_json(cursor_path) == {
+        "min_timestamp": 1700000010,
+        "boundary_ids": [2, 3],
+    }
+
+    # Nothing new: the boundary visits are fetched again but not yielded
+    requests_params.clear()
+    assert list(client.live.streamVisits(cursor_path, page_size=2)) == []
+    assert requests_params[0]["minTimestamp"] == "1700000009"
+    assert requests_params[0]["period"] == "range"
+
+    visits.append({"idVisit": 4, "lastActionTimestamp": 1700000020})
+    second_poll = list(client.live.streamVisits(cursor_path, page_size=2))
+    assert [visit["idVisit"] for visit in second_poll] == [4]
+
+    # A visit getting a new action while polling moves to the end of the list
+    # without making the next page skip a visit
+    visits.extend(
+        [
+            {"idVisit": 5, "lastActionTimestamp": 1700000030},
+            {"idVisit": 6, "lastActionTimestamp": 1700000040},
+            {"idVisit": 7, "lastActionTimestamp": 1700000050},
+        ]
+    )
+    stream = client.live.streamVisits(cursor_path, page_size=2)
+    polled = [next(stream)["idVisit"]]
+    visits[4] = {"idVisit": 5, "lastActionTimestamp": 1700000060}
+    polled.extend(visit["idVisit"] for visit in stream)
+    assert polled == [5, 6, 7, 5]
+
+
+def tracking_hits(batch):
+    return [dict(parse_qsl(hit.lstrip("?"))) for hit in batch]
+
+
+@responses.activate
+def test_bulk_tracking(tmp_path):
+    config = Config(
+        base_url="https://analytics.maaap.it", site_id="2", token_auth="random_token"
+    )
+    client = MatomoClient(config)
+    tracking_url = f"{client.base_url}/matomo.php"
+    spool_dir = tmp_path / "spool"
+    started = int(time.time())
+
+    responses.add(responses.POST, tracking_url, body=requests.ConnectionError())
+
+    tracker = client.tracker(batch_size=2, flush_interval=60, spool_dir=str(spool_dir))
+    tracker.track(url="https://example.com/a", action_name="a")
+    tracker.flush()
+
+    # Server unavailable: the batch is spooled on disk
+    spooled = list(spool_dir.iterdir())
+    assert len(spooled) == 1
+    hit = tracking_hits(read_json(str(spooled[0])))[0]
+    assert hit["idsite"] == "2"
+    assert hit["rec"] == "1"
+    assert hit["url"] == "https://example.com/a"
+    # Hits keep the time they were tracked at
+    assert started <= int(hit["cdt"]) <= time.time()
+
+    responses.replace(
+        responses.POST, tracking_url, json={"status": "success", "tracked": 2, "invalid": 0}
+    )
+
+    tracker.track(url="https://example.com/b", action_name="b")
+    tracker.track(url="https://example.com/c", action_name="c")
+    tracker.close()
+
+    bodies = [json.loads(call.request.body) for call in responses.calls[1:]]
+    assert bodies[0]["token_auth"] == "random_token"
+    assert [hit["action_name"] for hit in tracking_hits(bodies[0]["requests"])] == ["b", "c"]
+    assert [hit["action_name"] for hit in tracking_hits(bodies[1]["requests"])] == ["a"]
+    assert list(spool_dir.iterdir()) == []
+
+    try:
+        tracker.track(action_name="closed")
+        assert False, "closed tracker should reject hits"
+    except MatomoRequestError as err:
+        assert "Tracker is closed" in str(err)
+
+
+@responses.activate
+def test_bulk_tracking_spool_replay(tmp_path):
+    config = Config(
+        base_url="https://analytics.maaap.it", site_id="2", token_auth="random_token"
+    )
+    client = MatomoClient(config)
+    tracking_url = f"{client.base_url}/matomo.php"
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+
+    # A batch Matomo refuses is set aside and does not block the others
+    (spool_dir / "1-bad.json").write_text(json.dumps(["?idsite=2&rec=1&action_name=bad"]))
+    (spool_dir / "2-good.json").write_text(json.dumps(["?idsite=2&rec=1&action_name=good"]))
+
+    def bulk(request):
+        hits = tracking_hits(json.loads(request.body)["requests"])
+        if hits[0]["action_name"] == "bad":
+            return 400, {}, json.dumps({"status": "error"})
+        return 200, {}, json.dumps({"status": "success", "tracked": 1, "invalid": 0})
+
+    responses.add_callback(responses.POST, tracking_url, callback=bulk)
+
+    # No hit is tracked: the spool is retried on the timer
+    tracker = client.tracker(flush_interval=0.05, spool_dir=str(spool_dir))
+    for _ in range(100):
+        if len(responses.calls) >= 2:
+            break
+        time.sleep(0.01)
+    tracker.close()
+
+    assert sorted(path.name for path in spool_dir.iterdir()) == ["1-bad.json.rejected"]
+
+
+@responses.activate
+def test_bulk_tracking_retryable_errors(tmp_path):
+    config = Config(
+        base_url="https://analytics.maaap.it", site_id="2", token_auth="random_token"
+    )
+    client = MatomoClient(config)
+    tracking_url = f"{client.base_url}/matomo.php"
+    spool_dir = tmp_path / "spool"
+
+    # Rate limited, or a 200 that does not come from Matomo: kept for retry
+    answers = [(429, {}), (200, ["proxy"])]
+
+    def bulk(request):
+        status, body = answers.pop(0)
+        return status, {}, json.dumps(body)
+
+    responses.add_callback(responses.POST, tracking_url, callback=bulk)
+
+    tracker = client.tracker(flush_interval=60, spool_dir=str(spool_dir))
+    for _ in range(2):
+        tracker.track(action_name="retry")
+        tracker.flush()
+    tracker.close()
+
+    spooled = sorted(path.name for path in spool_dir.iterdir())
+    assert len(spooled) == 2
+    assert all(name.endswith(".json") for name in spooled)